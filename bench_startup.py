@@ -0,0 +1,49 @@
+"""Measure cold-start cost: module import time and first-request latency.
+
+Usage:
+    python bench_startup.py [--runs N]
+
+Each run uses a fresh interpreter so nothing is cached between runs. Set
+MONGO_URI to see the effect of a slow or unreachable database.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import os
+
+PROBE = r'''
+import time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+client.get('/')
+t2 = time.perf_counter()
+client.get('/api/health')
+t3 = time.perf_counter()
+print(f"{t1 - t0:.4f} {t2 - t1:.4f} {t3 - t2:.4f}")
+'''
+
+
+def run_once(cwd):
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=cwd, capture_output=True, text=True, check=True)
+    return [float(x) for x in output.stdout.strip().splitlines()[-1].split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    samples = [run_once(cwd) for _ in range(args.runs)]
+    labels = ['import app', 'first page (/)', 'first DB request (/api/health)']
+    print(f"Cold start over {args.runs} runs (median / max, seconds)")
+    for i, label in enumerate(labels):
+        values = [sample[i] for sample in samples]
+        print(f"  {label:<32} {statistics.median(values):.4f} / {max(values):.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+# Loaded automatically by `gunicorn app:app` (see Procfile)
+import os
+
+# Threaded workers so long-lived dashboard streams (/api/admin/monitor/stream)
+# don't pin a whole worker each
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def post_worker_init(worker):
+    """Open this worker's own MongoDB client and map the question bank before serving"""
+    from app import warmup
+    warmup()
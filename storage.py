@@ -0,0 +1,753 @@
+"""Storage backends for the O-Level exam app.
+
+The routes talk to collections through the subset of the pymongo Collection API
+they actually use (find/find_one with projection, sort, skip, limit and
+batch_size; insert/update/delete one & many; count_documents; distinct;
+find_one_and_update; bulk_write; create_index). open_database() returns either a
+real pymongo Database or a SQLiteDatabase that implements the same subset on an
+embedded SQLite file, so a single box gets real persistence without a MongoDB
+server.
+
+SQLite layout: one table per collection, (id TEXT PRIMARY KEY, doc TEXT) with
+the document stored as JSON. Values JSON can't hold are written as tagged
+strings so they still compare and index correctly inside SQLite:
+    ObjectId -> "$oid:<hex>"    datetime -> "$date:<YYYY-MM-DDTHH:MM:SS.ffffff>"
+    bytes    -> "$bin:<base64>" str starting with "$" -> "$str:<value>"
+Filters built only from field equality, comparisons, $in/$nin/$ne/$exists,
+$and and $or are compiled to SQL over json_extract() and can use the expression
+indexes made by create_index(); anything else is matched in Python.
+"""
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.results import (BulkWriteResult, DeleteResult, InsertManyResult,
+                             InsertOneResult, UpdateResult)
+
+DATABASE_NAME = 'olevel_exam'
+NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+FIELD_PATTERN = re.compile(r'^[A-Za-z0-9_]+$')
+COMPARISONS = {'$lt': '<', '$lte': '<=', '$gt': '>', '$gte': '>='}
+
+
+# ---------- value encoding ----------
+
+def encode_value(value):
+    if isinstance(value, str):
+        return '$str:' + value if value.startswith('$') else value
+    if isinstance(value, ObjectId):
+        return '$oid:' + str(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return '$date:' + value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return '$bin:' + base64.b64encode(bytes(value)).decode('ascii')
+    if isinstance(value, dict):
+        return {str(k): encode_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    return value
+
+def decode_value(value):
+    if isinstance(value, str):
+        if value.startswith('$'):
+            tag, _, body = value.partition(':')
+            if tag == '$oid':
+                return ObjectId(body)
+            if tag == '$date':
+                return datetime.strptime(body, '%Y-%m-%dT%H:%M:%S.%f')
+            if tag == '$bin':
+                return base64.b64decode(body)
+            if tag == '$str':
+                return body
+        return value
+    if isinstance(value, dict):
+        return {k: decode_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    return value
+
+def dump_doc(doc):
+    return json.dumps(encode_value(doc), separators=(',', ':'))
+
+def load_doc(text):
+    return decode_value(json.loads(text))
+
+
+# ---------- documents ----------
+
+MISSING = object()
+
+def get_path(doc, path):
+    value = doc
+    for part in path.split('.'):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return MISSING
+    return value
+
+def set_path(doc, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+def unset_path(doc, path):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+def type_rank(value):
+    # Mongo's cross-type ordering, reduced to the types this app stores
+    if value is None or value is MISSING:
+        return 0
+    if isinstance(value, bool):
+        return 5
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, (bytes, bytearray)):
+        return 4
+    if isinstance(value, ObjectId):
+        return 4.5
+    if isinstance(value, datetime):
+        return 6
+    return 7
+
+def sort_key(value):
+    if value is MISSING:
+        value = None
+    return (type_rank(value), value if value is not None and not isinstance(value, (dict, list)) else 0)
+
+def compare(a, b, op):
+    if type_rank(a) != type_rank(b) or a is None or b is None:
+        return False
+    try:
+        return {'$lt': a < b, '$lte': a <= b, '$gt': a > b, '$gte': a >= b}[op]
+    except TypeError:
+        return False
+
+def values_equal(value, target):
+    if value is MISSING:
+        return target is None
+    if isinstance(value, list) and not isinstance(target, list):
+        return any(values_equal(v, target) for v in value)
+    if isinstance(value, bool) != isinstance(target, bool):
+        return False
+    return value == target
+
+def match_condition(value, condition):
+    if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+        for op, arg in condition.items():
+            if op == '$eq':
+                ok = values_equal(value, arg)
+            elif op == '$ne':
+                ok = not values_equal(value, arg)
+            elif op == '$in':
+                ok = any(values_equal(value, a) for a in arg)
+            elif op == '$nin':
+                ok = not any(values_equal(value, a) for a in arg)
+            elif op in COMPARISONS:
+                candidates = value if isinstance(value, list) else [value]
+                ok = any(compare(v, arg, op) for v in candidates)
+            elif op == '$exists':
+                ok = (value is not MISSING) == bool(arg)
+            else:
+                raise NotImplementedError(f"Query operator {op} is not supported by the SQLite backend")
+            if not ok:
+                return False
+        return True
+    return values_equal(value, condition)
+
+def match(doc, spec):
+    for key, condition in spec.items():
+        if key == '$and':
+            if not all(match(doc, sub) for sub in condition):
+                return False
+        elif key == '$or':
+            if not any(match(doc, sub) for sub in condition):
+                return False
+        elif key.startswith('$'):
+            raise NotImplementedError(f"Query operator {key} is not supported by the SQLite backend")
+        elif not match_condition(get_path(doc, key), condition):
+            return False
+    return True
+
+def apply_update(doc, update, inserting=False):
+    if not update or not all(k.startswith('$') for k in update):
+        raise ValueError('update only works with $ operators')
+    for op, fields in update.items():
+        for path, value in fields.items():
+            if path == '_id':
+                continue
+            if op == '$set':
+                set_path(doc, path, value)
+            elif op == '$setOnInsert':
+                if inserting:
+                    set_path(doc, path, value)
+            elif op == '$unset':
+                unset_path(doc, path)
+            elif op == '$inc':
+                current = get_path(doc, path)
+                set_path(doc, path, (0 if current is MISSING else current) + value)
+            elif op == '$push':
+                current = get_path(doc, path)
+                set_path(doc, path, ([] if current is MISSING else list(current)) + [value])
+            elif op == '$addToSet':
+                items = list([] if get_path(doc, path) is MISSING else get_path(doc, path))
+                added = value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+                for item in added:
+                    if not any(values_equal(existing, item) for existing in items):
+                        items.append(item)
+                set_path(doc, path, items)
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported by the SQLite backend")
+    return doc
+
+def project(doc, projection):
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = bool(projection.get('_id', 1))
+    fields = {k: v for k, v in projection.items() if k != '_id'}
+    if fields and all(fields.values()):
+        out = {}
+        for path in fields:
+            value = get_path(doc, path)
+            if value is not MISSING:
+                set_path(out, path, value)
+    else:
+        out = dict(doc)
+        for path in fields:
+            unset_path(out, path)
+    if include_id and '_id' in doc:
+        out['_id'] = doc['_id']
+    else:
+        out.pop('_id', None)
+    return out
+
+def upsert_seed(spec):
+    """Fields an upsert copies from the filter into the new document"""
+    doc = {}
+    for key, condition in spec.items():
+        if key.startswith('$'):
+            continue
+        if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+            if '$eq' in condition:
+                set_path(doc, key, condition['$eq'])
+        else:
+            set_path(doc, key, condition)
+    return doc
+
+
+# ---------- SQL compilation ----------
+
+def json_path(field):
+    if not all(FIELD_PATTERN.match(part) for part in field.split('.')):
+        return None
+    return '$' + ''.join(f'."{part}"' for part in field.split('.'))
+
+def field_expr(field):
+    if field == '_id':
+        return 'id'
+    path = json_path(field)
+    return None if path is None else f"json_extract(doc, '{path}')"
+
+def scalar(value):
+    return not isinstance(value, (dict, list, tuple))
+
+def sql_value(value):
+    value = encode_value(value)
+    return int(value) if isinstance(value, bool) else value
+
+def compile_condition(field, condition):
+    expr = field_expr(field)
+    if expr is None:
+        return None
+    if not (isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition)):
+        if not scalar(condition):
+            return None
+        if condition is None:
+            return f"{expr} IS NULL", []
+        return f"{expr} = ?", [sql_value(condition)]
+    clauses, params = [], []
+    for op, arg in condition.items():
+        if op == '$eq' and scalar(arg):
+            clauses.append(f"{expr} IS NULL" if arg is None else f"{expr} = ?")
+            params += [] if arg is None else [sql_value(arg)]
+        elif op == '$ne' and scalar(arg):
+            clauses.append(f"{expr} IS NOT NULL" if arg is None else f"{expr} IS NOT ?")
+            params += [] if arg is None else [sql_value(arg)]
+        elif op in COMPARISONS and scalar(arg) and arg is not None:
+            clauses.append(f"{expr} {COMPARISONS[op]} ?")
+            params.append(sql_value(arg))
+        elif op in ('$in', '$nin') and isinstance(arg, (list, tuple)) and all(scalar(a) for a in arg):
+            values = [a for a in arg if a is not None]
+            parts = []
+            if values:
+                parts.append(f"{expr} IN ({','.join('?' * len(values))})")
+                params += [sql_value(a) for a in values]
+            if len(values) != len(arg):
+                parts.append(f"{expr} IS NULL")
+            clause = '(' + ' OR '.join(parts) + ')' if parts else '0'
+            if op == '$nin':
+                clause = f"NOT {clause}" if parts else '1'
+            clauses.append(clause)
+        elif op == '$exists':
+            if field == '_id':
+                clauses.append('1' if arg else '0')
+            else:
+                clauses.append(f"json_type(doc, '{json_path(field)}') IS {'NOT ' if arg else ''}NULL")
+        else:
+            return None
+    return ' AND '.join(clauses), params
+
+def compile_filter(spec):
+    """Translate a filter to (sql, params), or None when it needs the Python matcher"""
+    clauses, params = [], []
+    for key, condition in spec.items():
+        if key in ('$and', '$or'):
+            parts = [compile_filter(sub) for sub in condition]
+            if not parts or any(p is None for p in parts):
+                return None
+            joiner = ' AND ' if key == '$and' else ' OR '
+            clauses.append('(' + joiner.join(f'({sql})' for sql, _ in parts) + ')')
+            for _, sub_params in parts:
+                params += sub_params
+        elif key.startswith('$'):
+            return None
+        else:
+            compiled = compile_condition(key, condition)
+            if compiled is None:
+                return None
+            clauses.append(compiled[0])
+            params += compiled[1]
+    return (' AND '.join(clauses) or '1'), params
+
+def normalize_sort(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    return [(k, d) for k, d in key_or_list]
+
+def normalize_keys(keys):
+    if isinstance(keys, str):
+        return [(keys, 1)]
+    return list(keys)
+
+
+# ---------- collection ----------
+
+class SQLiteCursor:
+    """Lazy query over a SQLite collection; mirrors the chained pymongo cursor calls"""
+
+    def __init__(self, collection, spec, projection):
+        self.collection = collection
+        self.spec = spec or {}
+        self.projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._batch_size = 1000
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        self._batch_size = size or 1000
+        return self
+
+    def __iter__(self):
+        for doc in self.collection._select(self.spec, self._sort, self._skip, self._limit, self._batch_size):
+            yield project(doc, self.projection)
+
+    def close(self):
+        pass
+
+
+class SQLiteCollection:
+    def __init__(self, database, name):
+        if not NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid collection name: {name}")
+        self.database = database
+        self.name = name
+        self.table = f'"{name}"'
+
+    def __repr__(self):
+        return f"SQLiteCollection({self.name!r})"
+
+    def _conn(self):
+        conn = self.database.connection()
+        self.database.ensure_table(conn, self.name)
+        return conn
+
+    # -- reads --
+
+    def _select(self, spec, sort=None, skip=0, limit=0, batch_size=1000, with_ids=False, conn=None):
+        conn = conn or self._conn()
+        compiled = compile_filter(spec)
+        order = None
+        if sort:
+            exprs = [field_expr(field) for field, _ in sort]
+            if all(exprs):
+                order = ', '.join(f"{e} {'DESC' if d == -1 else 'ASC'}" for e, (_, d) in zip(exprs, sort))
+        if compiled is not None and (order or not sort):
+            sql = f"SELECT id, doc FROM {self.table} WHERE {compiled[0]} ORDER BY {(order + ', ') if order else ''}rowid"
+            params = list(compiled[1])
+            if limit or skip:
+                sql += ' LIMIT ? OFFSET ?'
+                params += [limit if limit else -1, skip]
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row_id, text in rows:
+                    doc = load_doc(text)
+                    yield (row_id, doc) if with_ids else doc
+
+        # Python fallback: prefilter nothing, match, sort and page in memory
+        where, params = compiled if compiled is not None else ('1', [])
+        docs = [(row_id, load_doc(text)) for row_id, text in
+                conn.execute(f"SELECT id, doc FROM {self.table} WHERE {where} ORDER BY rowid", params)]
+        docs = [(row_id, doc) for row_id, doc in docs if match(doc, spec)]
+        for field, direction in reversed(sort or []):
+            docs.sort(key=lambda item: sort_key(get_path(item[1], field)), reverse=direction == -1)
+        docs = docs[skip:skip + limit] if limit else docs[skip:]
+        for row_id, doc in docs:
+            yield (row_id, doc) if with_ids else doc
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, batch_size=0):
+        cursor = SQLiteCursor(self, filter, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit).batch_size(batch_size)
+
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        for doc in self.find(filter, projection, sort=sort).limit(1):
+            return doc
+        return None
+
+    def count_documents(self, filter, **kwargs):
+        compiled = compile_filter(filter)
+        if compiled is not None:
+            return self._conn().execute(f"SELECT COUNT(*) FROM {self.table} WHERE {compiled[0]}",
+                                        compiled[1]).fetchone()[0]
+        return sum(1 for _ in self._select(filter))
+
+    def estimated_document_count(self, **kwargs):
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def distinct(self, key, filter=None, **kwargs):
+        values = []
+        seen = set()
+        for doc in self._select(filter or {}):
+            value = get_path(doc, key)
+            for v in (value if isinstance(value, list) else [value]):
+                if v is MISSING:
+                    continue
+                marker = json.dumps(encode_value(v), sort_keys=True)
+                if marker not in seen:
+                    seen.add(marker)
+                    values.append(v)
+        return values
+
+    # -- writes --
+
+    def _insert(self, conn, doc):
+        if '_id' not in doc:
+            doc['_id'] = ObjectId()
+        try:
+            conn.execute(f"INSERT INTO {self.table} (id, doc) VALUES (?, ?)",
+                         (sql_value(doc['_id']), dump_doc(doc)))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} ({e})", 11000)
+        return doc['_id']
+
+    def _update(self, conn, spec, update, many, upsert):
+        matched = modified = 0
+        upserted_id = None
+        for row_id, doc in list(self._select(spec, limit=0 if many else 1, with_ids=True, conn=conn)):
+            matched += 1
+            before = dump_doc(doc)
+            after = dump_doc(apply_update(doc, update))
+            if after != before:
+                try:
+                    conn.execute(f"UPDATE {self.table} SET doc = ? WHERE id = ?", (after, row_id))
+                except sqlite3.IntegrityError as e:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} ({e})", 11000)
+                modified += 1
+        if matched == 0 and upsert:
+            upserted_id = self._insert(conn, apply_update(upsert_seed(spec), update, inserting=True))
+        return matched, modified, upserted_id
+
+    def _delete(self, conn, spec, many):
+        ids = [row_id for row_id, _ in self._select(spec, limit=0 if many else 1, with_ids=True, conn=conn)]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            conn.execute(f"DELETE FROM {self.table} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        return len(ids)
+
+    def insert_one(self, document, **kwargs):
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            return InsertOneResult(self._insert(conn, document), True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        documents = list(documents)
+        errors = []
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            for index, doc in enumerate(documents):
+                try:
+                    self._insert(conn, doc)
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": doc})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [],
+                                  "nInserted": len(documents) - len(errors) if not ordered else errors[0]['index'],
+                                  "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []})
+        return InsertManyResult([doc['_id'] for doc in documents], True)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            matched, modified, upserted_id = self._update(conn, filter, update, False, upsert)
+        return UpdateResult({"n": matched or int(upserted_id is not None), "nModified": modified,
+                             "upserted": upserted_id}, True)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            matched, modified, upserted_id = self._update(conn, filter, update, True, upsert)
+        return UpdateResult({"n": matched or int(upserted_id is not None), "nModified": modified,
+                             "upserted": upserted_id}, True)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            rows = list(self._select(filter, limit=1, with_ids=True, conn=conn))
+            if rows:
+                row_id, doc = rows[0]
+                replacement = dict(replacement, _id=doc['_id'])
+                conn.execute(f"UPDATE {self.table} SET doc = ? WHERE id = ?", (dump_doc(replacement), row_id))
+                return UpdateResult({"n": 1, "nModified": 1}, True)
+            if upsert:
+                return UpdateResult({"n": 1, "nModified": 0, "upserted": self._insert(conn, dict(replacement))}, True)
+        return UpdateResult({"n": 0, "nModified": 0}, True)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=False, **kwargs):
+        """return_document follows pymongo.ReturnDocument (False = BEFORE, True = AFTER)"""
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            rows = list(self._select(filter, sort=normalize_sort(sort) if sort else None, limit=1,
+                                     with_ids=True, conn=conn))
+            if not rows:
+                if not upsert:
+                    return None
+                doc = apply_update(upsert_seed(filter), update, inserting=True)
+                self._insert(conn, doc)
+                return project(doc, projection) if return_document else None
+            row_id, doc = rows[0]
+            before = load_doc(dump_doc(doc))
+            conn.execute(f"UPDATE {self.table} SET doc = ? WHERE id = ?", (dump_doc(apply_update(doc, update)), row_id))
+            return project(doc if return_document else before, projection)
+
+    def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            rows = list(self._select(filter, sort=normalize_sort(sort) if sort else None, limit=1,
+                                     with_ids=True, conn=conn))
+            if not rows:
+                return None
+            conn.execute(f"DELETE FROM {self.table} WHERE id = ?", (rows[0][0],))
+            return project(rows[0][1], projection)
+
+    def delete_one(self, filter, **kwargs):
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            return DeleteResult({"n": self._delete(conn, filter, False)}, True)
+
+    def delete_many(self, filter, **kwargs):
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            return DeleteResult({"n": self._delete(conn, filter, True)}, True)
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        """Apply pymongo InsertOne/UpdateOne/UpdateMany/ReplaceOne/DeleteOne/DeleteMany requests"""
+        totals = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0,
+                  "upserted": [], "writeErrors": [], "writeConcernErrors": []}
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            for index, op in enumerate(requests):
+                kind = type(op).__name__
+                try:
+                    if kind == 'InsertOne':
+                        self._insert(conn, op._doc)
+                        totals['nInserted'] += 1
+                    elif kind in ('UpdateOne', 'UpdateMany'):
+                        matched, modified, upserted_id = self._update(conn, op._filter, op._doc,
+                                                                      kind == 'UpdateMany', op._upsert)
+                        totals['nMatched'] += matched
+                        totals['nModified'] += modified
+                        if upserted_id is not None:
+                            totals['nUpserted'] += 1
+                            totals['upserted'].append({"index": index, "_id": upserted_id})
+                    elif kind in ('DeleteOne', 'DeleteMany'):
+                        totals['nRemoved'] += self._delete(conn, op._filter, kind == 'DeleteMany')
+                    elif kind == 'ReplaceOne':
+                        rows = list(self._select(op._filter, limit=1, with_ids=True, conn=conn))
+                        if rows:
+                            conn.execute(f"UPDATE {self.table} SET doc = ? WHERE id = ?",
+                                         (dump_doc(dict(op._doc, _id=rows[0][1]['_id'])), rows[0][0]))
+                            totals['nMatched'] += 1
+                            totals['nModified'] += 1
+                        elif op._upsert:
+                            upserted_id = self._insert(conn, dict(op._doc))
+                            totals['nUpserted'] += 1
+                            totals['upserted'].append({"index": index, "_id": upserted_id})
+                    else:
+                        raise NotImplementedError(f"{kind} is not supported by the SQLite backend")
+                except DuplicateKeyError as e:
+                    totals['writeErrors'].append({"index": index, "code": 11000, "errmsg": str(e)})
+                    if ordered:
+                        break
+        if totals['writeErrors']:
+            raise BulkWriteError(totals)
+        return BulkWriteResult(totals, True)
+
+    # -- admin --
+
+    def create_index(self, keys, unique=False, name=None, **kwargs):
+        keys = normalize_keys(keys)
+        exprs = [field_expr(field) for field, _ in keys]
+        if not all(exprs):
+            raise ValueError(f"Cannot index {keys}")
+        name = name or '_'.join(f"{field}_{direction}" for field, direction in keys)
+        index_name = f"ix_{self.name}_{re.sub(r'[^A-Za-z0-9_]', '_', name)}"
+        columns = ', '.join(f"{e} {'DESC' if d == -1 else 'ASC'}" for e, (_, d) in zip(exprs, keys))
+        with self.database.write() as conn:
+            self.database.ensure_table(conn, self.name)
+            conn.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{index_name}" '
+                         f'ON {self.table} ({columns})')
+        return name
+
+    def drop(self):
+        with self.database.write() as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {self.table}")
+            self.database.forget_table(self.name)
+
+
+class SQLiteDatabase:
+    """Database handle over one SQLite file; one connection per thread per process"""
+
+    def __init__(self, path, name=DATABASE_NAME):
+        self.path = path
+        self.name = name
+        self._local = threading.local()
+        self._tables = set()
+        self._tables_pid = None
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA cache_size=-16000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def write(self):
+        """Serialize a write against every other connection (BEGIN IMMEDIATE), nesting safely"""
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def ensure_table(self, conn, name):
+        if self._tables_pid != os.getpid():
+            self._tables, self._tables_pid = set(), os.getpid()
+        if name in self._tables:
+            return
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (id TEXT PRIMARY KEY, doc TEXT NOT NULL)')
+        self._tables.add(name)
+
+    def forget_table(self, name):
+        self._tables.discard(name)
+
+    def __getitem__(self, name):
+        return SQLiteCollection(self, name)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return SQLiteCollection(self, name)
+
+    def get_collection(self, name):
+        return SQLiteCollection(self, name)
+
+    def list_collection_names(self):
+        rows = self.connection().execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        return [name for name, in rows if not name.startswith('sqlite_')]
+
+    def command(self, name, *args, **kwargs):
+        if name == 'ping':
+            self.connection().execute('SELECT 1')
+            return {"ok": 1.0}
+        raise NotImplementedError(f"Command {name} is not supported by the SQLite backend")
+
+
+def open_database(backend, mongo_uri=None, sqlite_path=None):
+    """Return (backend name, database handle) for 'mongo' or 'sqlite'"""
+    if backend == 'mongo':
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+        client.server_info()
+        return 'mongo', client[DATABASE_NAME]
+    if backend == 'sqlite':
+        return 'sqlite', SQLiteDatabase(sqlite_path)
+    raise ValueError(f"Unknown storage backend: {backend}")